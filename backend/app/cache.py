@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+import time
+
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional
+
+
+def _make_key(args, kwargs) -> str:
+    """Hash the normalized arguments so identical inputs share one entry"""
+    parts = [str(a).strip().lower() for a in args]
+    parts += [f"{k}={str(v).strip().lower()}" for k, v in sorted(kwargs.items())]
+    return hashlib.blake2b("|".join(parts).encode()).hexdigest()
+
+
+def async_lru(maxsize: int = 4096, ttl: Optional[float] = None):
+    """
+    LRU cache decorator for async functions, with an optional TTL in seconds.
+
+    Many products share identical ingredient lines, so caching agent results
+    by input turns repeat analyses into dictionary lookups. Negative results
+    (e.g. no URL found) are cached too, so failed lookups are not retried.
+    A TTL lets read-through caches over the database pick up fresh rows.
+    """
+    def decorator(fn):
+        cache: OrderedDict = OrderedDict()
+        lock = asyncio.Lock()
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            async with lock:
+                entry = cache.get(key)
+                if entry is not None:
+                    value, expires = entry
+                    if expires is None or expires > time.monotonic():
+                        cache.move_to_end(key)
+                        return value
+                    del cache[key]
+
+            value = await fn(*args, **kwargs)
+
+            async with lock:
+                cache[key] = (value, (time.monotonic() + ttl) if ttl else None)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        return wrapper
+    return decorator
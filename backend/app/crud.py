@@ -1,20 +1,32 @@
 from agno.agent import RunResponse
 from dotenv import load_dotenv
-from pydantic import HttpUrl, ValidationError
+from pydantic import ValidationError
+from rapidfuzz import process, utils as fuzz_utils
+from rapidfuzz.distance import JaroWinkler
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 import app.agent as agent
-from app.schemas import ProductSearchResponse, AutocompleteSuggestion, ProductSearchRequest, PotentialHealthIssues, DieticanAgentResponse
+from app.cache import async_lru
+from app.prefix_index import PrefixIndex
+from app.schemas import ProductSearchResponse, AutocompleteSuggestion, ProductSearchRequest, CombinedDieticianResponse
 
+import asyncio
+import logging
+import orjson
 import os
 import re
-from typing import List, Optional, Tuple
+from typing import List, Optional
 
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+# Compiled once so the hot search path skips the regex-cache lookup, and the
+# \s* swallows the whitespace that trailed each ingredient after a bare [,;] split
+_SPLIT_RE = re.compile(r'[,;]\s*')
+
 # PostgreSQL configuration
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
@@ -23,35 +35,159 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Per-worker pool sizing: every gunicorn worker gets its own engine, so the
+# server-side total is workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW). Tune the
+# env vars down if Postgres max_connections is tight.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
 
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,
-    pool_size=5,            # number of connections in the pool
-    max_overflow=20,         # additional connections allowed beyond pool_size
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_timeout=30,         # seconds to wait for a connection
-    pool_recycle=1800        # recycle connections after 30 minutes
+    pool_recycle=1800,       # recycle connections after 30 minutes
+    pool_pre_ping=True,      # drop stale connections before handing them out
+    connect_args={
+        "prepared_statement_cache_size": 1024,
+        # JIT compilation only adds overhead to short OLTP queries
+        "server_settings": {"jit": "off"},
+    },
 )
 
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+class ProductSearchError(Exception):
+    """Raised when the search pipeline fails partway (e.g. the dietician analysis errors)"""
+
+
+# In-memory autocomplete index, rebuilt periodically from the products table
+_prefix_index = PrefixIndex()
+_PREFIX_INDEX_REFRESH = 15 * 60  # seconds
+_refresh_task = None
+_index_generation = 0
+
+
+def get_index_generation() -> int:
+    """Monotonic counter bumped on every index rebuild, for cache validators"""
+    return _index_generation
+
+
+# Pre-serialized suggestion payloads for short prefixes, rebuilt with the
+# index: 2- and 3-char prefixes dominate autocomplete traffic, and a baked
+# bytes response costs one dict lookup — no Pydantic, no JSON encoding
+_prebaked = {}
+
+
+def _prebake_suggestions(index: PrefixIndex) -> dict:
+    baked = {}
+    for prefix in index.token_prefixes(lengths=(2, 3)):
+        rows = index.lookup(prefix, limit=5)
+        baked[prefix] = orjson.dumps([
+            {
+                'fdc_id': index.fdc_ids[i],
+                'name': index.names[i],
+                'brand': index.brands[i],
+                'category': index.categories[i],
+            }
+            for i in rows
+        ])
+    return baked
+
+
+def get_prebaked_suggestions(query: str) -> Optional[bytes]:
+    """Pre-serialized autocomplete response bytes, if this prefix was baked"""
+    return _prebaked.get(query.lower())
+
+
+def _build_index(rows):
+    """Build a fresh index plus its prebaked payloads; runs on a worker thread"""
+    index = PrefixIndex()
+    index.build(rows)
+    return index, _prebake_suggestions(index)
+
 
+async def refresh_prefix_index() -> None:
+    """Rebuild the in-memory autocomplete index from the products table"""
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT fdc_id, description, brand_name, brand_owner, branded_food_category FROM products"
+        ))
+        rows = result.mappings().all()
 
+    # The token sort and prebake pass take seconds at catalog scale, so
+    # build into a fresh index on a thread and swap the references in —
+    # in-flight requests keep reading the old index, never a stalled loop
+    global _prefix_index, _prebaked, _index_generation
+    _prefix_index, _prebaked = await asyncio.to_thread(_build_index, rows)
+    _index_generation += 1
+    log.info("Prefix index rebuilt with %s products, %s prebaked prefixes", len(rows), len(_prebaked))
+
+
+async def _prefix_index_refresher() -> None:
+    while True:
+        try:
+            await refresh_prefix_index()
+        except Exception as e:
+            log.error("Error refreshing prefix index: %s", e)
+        await asyncio.sleep(_PREFIX_INDEX_REFRESH)
+
+
+def start_prefix_index_refresh() -> None:
+    """Kick off the periodic index rebuild; called from app startup"""
+    global _refresh_task
+    if _refresh_task is None:
+        _refresh_task = asyncio.create_task(_prefix_index_refresher())
+
+
+@async_lru(maxsize=4096, ttl=300)
 async def get_autocomplete_suggestions(query: str) -> List[AutocompleteSuggestion]:
-    """Get autocomplete suggestions from PostgreSQL"""
+    """Get autocomplete suggestions from the in-memory index, or PostgreSQL until it is built"""
+    # Single-token prefixes are served straight from memory; multi-word
+    # queries keep using the tsquery path, which understands word order
+    if _prefix_index.ready and ' ' not in query:
+        rows = _prefix_index.lookup(query, limit=5)
+        if not rows:
+            # No token starts with this prefix (likely a typo) — fall back
+            # to RapidFuzz's SIMD scorer over the catalog names. Jaro-Winkler
+            # favors shared prefixes, which suits partially typed names better
+            # than edit distance
+            matches = process.extract(query, _prefix_index.names,
+                                      scorer=JaroWinkler.normalized_similarity,
+                                      processor=fuzz_utils.default_process,
+                                      limit=5, score_cutoff=0.8)
+            rows = [i for _, _, i in matches]
+        return [
+            AutocompleteSuggestion.model_construct(
+                fdc_id=_prefix_index.fdc_ids[i],
+                name=_prefix_index.names[i],
+                brand=_prefix_index.brands[i],
+                category=_prefix_index.categories[i]
+            )
+            for i in rows
+        ]
+
     try:
-        async with async_session() as cursor:
-            search_query = f"""
+        # Plain connection — read-only raw SQL has no use for the session's
+        # unit-of-work machinery
+        async with engine.connect() as conn:
+            search_query = """
                 SELECT fdc_id, description, brand_name, brand_owner, branded_food_category
-                FROM search_products($${query.lower().replace(' ','+')}$$)
+                FROM search_products(:query)
                 LIMIT 5
             """
-            
-            result = await cursor.execute(text(search_query))
+
+            result = await conn.execute(text(search_query), {'query': query.lower().replace(' ', '+')})
             rows = result.mappings().all()
             
             suggestions = []
             for row in rows:
-                suggestions.append(AutocompleteSuggestion(
+                # model_construct: the row already conforms to the schema,
+                # so skip re-validating five suggestions per keystroke
+                suggestions.append(AutocompleteSuggestion.model_construct(
                     fdc_id=row['fdc_id'],
                     name=row['description'],
                     brand=row['brand_name'] or row['brand_owner'] or '',  # TODO: Include brand_owner if brand_name is not available?
@@ -62,20 +198,60 @@ async def get_autocomplete_suggestions(query: str) -> List[AutocompleteSuggestio
             return suggestions
         
     except Exception as e:
-        print(f"Error getting autocomplete suggestions: {e}")
+        log.error("Error getting autocomplete suggestions: %s", e)
         return []
 
-async def search_products_by(condition) -> Optional[ProductSearchResponse]:
+# Only the columns the response actually needs — the products table also
+# carries the autocomplete tsvector and other wide columns that SELECT *
+# would force Postgres to detoast and ship on every search
+_PRODUCT_COLUMNS = (
+    "fdc_id, description, brand_name, brand_owner, ingredients, nutrition_info, "
+    "branded_food_category, processed_score, processed_score_explanation, "
+    "nutrition_score, nutrition_score_explanation, health_issues, url"
+)
+
+# Keep strong references to in-flight persistence tasks so the event loop's
+# GC cannot cancel them before they finish
+_background_tasks = set()
+
+
+# One fixed-shape statement covers every combination of freshly computed
+# fields: COALESCE keeps whatever the row already had, and NULL parameters
+# leave missing fields untouched. Constant text means one prepared plan.
+_UPDATE_QUERY = text("""
+    UPDATE products SET
+        processed_score = COALESCE(processed_score, :processed_score),
+        processed_score_explanation = COALESCE(processed_score_explanation, :processed_score_explanation),
+        nutrition_score = COALESCE(nutrition_score, :nutrition_score),
+        nutrition_score_explanation = COALESCE(nutrition_score_explanation, :nutrition_score_explanation),
+        health_issues = COALESCE(health_issues, CAST(:health_issues AS json)),
+        url = COALESCE(url, :url)
+    WHERE fdc_id = :fdc_id
+""")
+
+
+async def _persist_scores(fdc_id: int, update_params: dict) -> None:
+    """Write freshly computed scores back to the products row"""
+    try:
+        async with async_session() as cursor:
+            await cursor.execute(_UPDATE_QUERY, update_params)
+            await cursor.commit()
+            log.info("Updated product %s", fdc_id)
+    except Exception as e:
+        log.error("Error updating product %s: %s", fdc_id, e)
+
+
+async def search_products_by(condition: str, params: dict) -> Optional[ProductSearchResponse]:
     """Search for products in the PostgreSQL database"""
     # try:
-    async with async_session() as cursor:
-        search_query = f"SELECT * FROM products WHERE {condition}"
-        
-        result = await cursor.execute(text(search_query))
+    async with engine.connect() as conn:
+        search_query = f"SELECT {_PRODUCT_COLUMNS} FROM products WHERE {condition} LIMIT 1"
+
+        result = await conn.execute(text(search_query), params)
         row = result.mappings().first()
-        
+
         if not row:
-            print(f"PostgreSQL: No results found for {condition}")
+            log.debug("PostgreSQL: No results found for %s with %s", condition, params)
             return None
         
         fdc_id: int = row['fdc_id']
@@ -84,74 +260,78 @@ async def search_products_by(condition) -> Optional[ProductSearchResponse]:
         ingredients: str = row['ingredients']
         nutrition_info: str = row['nutrition_info']
 
-        set_query = "" 
-        
-        if row.get('processed_score') is None:
-            # Calculate processing score
-            processed_score, processed_score_explanation = await calculate_processed_score(ingredients)
-            set_query += "processed_score = :processed_score, processed_score_explanation = :processed_score_explanation, "
-        else:
-            processed_score = row['processed_score']
-            processed_score_explanation = row['processed_score_explanation']
-
-        if row.get('nutrition_score') is None:
-            # Calculate nutrition score
-            nutrition_score, nutrition_score_explanation = await calculate_nutrition_score(nutrition_info)
-            set_query += "nutrition_score = :nutrition_score, nutrition_score_explanation = :nutrition_score_explanation, "
-        else:
-            nutrition_score = row['nutrition_score']
-            nutrition_score_explanation = row['nutrition_score_explanation']
-
-        if row.get('health_issues') is None:
-            # Get potential health issues
-            health_issues: PotentialHealthIssues = await get_health_issues(ingredients)
-            set_query += "health_issues = :health_issues, "
-        else:
-            health_issues = row['health_issues']
-        
-        if row.get('url') is None:
-            # Get product URL
-            url = await get_product_url(name, brand)
-            if url:
-                set_query += "url = :url, "
-        else:
-            url = row['url']
-
-        try:  
-            if set_query:
-                update_query = f"UPDATE products SET {set_query.rstrip(', ')} WHERE fdc_id = :fdc_id"
-                update_params = {'fdc_id': fdc_id}
-                if 'processed_score' in set_query:
-                    update_params.update({
-                        'processed_score': processed_score,
-                        'processed_score_explanation': processed_score_explanation
-                    })
-                if 'nutrition_score' in set_query:
-                    update_params.update({
-                        'nutrition_score': nutrition_score,
-                        'nutrition_score_explanation': nutrition_score_explanation
-                    })
-                if 'health_issues' in set_query:
-                    import json
-                    update_params.update({
-                        'health_issues': json.dumps(health_issues.model_dump())
-                    })
-                if 'url' in set_query:
-                    update_params.update({'url': url})
-                
-                await cursor.execute(text(update_query), update_params)
-                try:
-                    await cursor.commit()
-                    print(f"Updated product {fdc_id} with {set_query}")
-                except Exception as commit_error:
-                    print(f"Error committing update for product {fdc_id}: {commit_error}")
-        except Exception as e:
-            print(f"Error updating product {fdc_id}: {e}")
+        processed_score = row.get('processed_score')
+        processed_score_explanation = row.get('processed_score_explanation')
+        nutrition_score = row.get('nutrition_score')
+        nutrition_score_explanation = row.get('nutrition_score_explanation')
+        health_issues = row.get('health_issues')
+        url = row.get('url')
+
+        # The dietician analysis and the URL lookup are independent Gemini
+        # round-trips, so run the ones we need concurrently.
+        tasks = []
+        task_keys = []
+
+        if processed_score is None or nutrition_score is None or health_issues is None:
+            tasks.append(calculate_full_analysis(ingredients, nutrition_info))
+            task_keys.append('analysis')
+
+        if url is None:
+            tasks.append(get_product_url(name, brand))
+            task_keys.append('url')
+
+        analysis: Optional[CombinedDieticianResponse] = None
+        url_param = None
+
+        if tasks:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for key, value in zip(task_keys, results):
+                if key == 'analysis':
+                    if isinstance(value, Exception):
+                        raise ProductSearchError(f"Dietician analysis failed: {value}") from value
+                    analysis = value
+                    if processed_score is None:
+                        processed_score = analysis.processed_score
+                        processed_score_explanation = analysis.processed_score_explanation.strip()
+                    if nutrition_score is None:
+                        nutrition_score = analysis.nutrition_score
+                        nutrition_score_explanation = analysis.nutrition_score_explanation.strip()
+                    if health_issues is None:
+                        health_issues = analysis.health_issues
+                elif key == 'url':
+                    # A failed URL lookup should not abort the whole search
+                    if isinstance(value, Exception):
+                        log.warning("Error getting product URL: %s", value)
+                        url = None
+                    else:
+                        url = value
+                        # Persist '' when nothing was found so the Google
+                        # Search lookup is never repeated for this product;
+                        # only a genuine error leaves the column NULL
+                        url_param = url or ''
+
+        if analysis is not None or url_param is not None:
+            update_params = {
+                'fdc_id': fdc_id,
+                'processed_score': analysis.processed_score if analysis else None,
+                'processed_score_explanation': analysis.processed_score_explanation.strip() if analysis else None,
+                'nutrition_score': analysis.nutrition_score if analysis else None,
+                'nutrition_score_explanation': analysis.nutrition_score_explanation.strip() if analysis else None,
+                # Rust-backed serializer, much cheaper than json.dumps(model_dump())
+                'health_issues': analysis.health_issues.model_dump_json() if analysis else None,
+                'url': url_param,
+            }
+
+            # The client does not need to wait on this write, so run it in
+            # the background and return the response one DB round-trip sooner
+            task = asyncio.create_task(_persist_scores(fdc_id, update_params))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
 
         return ProductSearchResponse(
             name=name,
             brand=brand,
-            ingredients=re.split(r'[,;]', ingredients.strip()),
+            ingredients=_SPLIT_RE.split(ingredients.strip()),
             category=row['branded_food_category'],
             processed_score=processed_score,
             processed_score_explanation=processed_score_explanation,
@@ -159,7 +339,7 @@ async def search_products_by(condition) -> Optional[ProductSearchResponse]:
             nutrition_score_explanation=nutrition_score_explanation,
             health_issues=health_issues,
             # retailer=row.get('retailer'),
-            url=url
+            url=url or None  # '' is the "no URL found" sentinel in the DB
         )
         
     # except Exception as e:
@@ -167,6 +347,21 @@ async def search_products_by(condition) -> Optional[ProductSearchResponse]:
     #     return None
         
 
+# Dispatch table for search_products: the first request attribute with a
+# value picks its WHERE fragment, all sharing one :value bind parameter
+_SEARCH_CONDITIONS = {
+    'fdc_id': 'fdc_id = :value',
+    'gtin_upc': 'gtin_upc = :value',
+    'query': 'autocomplete @@ plainto_tsquery(:value)',
+}
+
+
+@async_lru(maxsize=4096, ttl=3600)
+async def _search_cached(field: str, value) -> Optional[ProductSearchResponse]:
+    """Read-through cache over search_products_by keyed on the lookup field/value"""
+    return await search_products_by(_SEARCH_CONDITIONS[field], {'value': value})
+
+
 async def search_products(request: ProductSearchRequest) -> Optional[ProductSearchResponse]:
     """
     Searches for products using natural language query.
@@ -174,63 +369,50 @@ async def search_products(request: ProductSearchRequest) -> Optional[ProductSear
     1. First searches local PostgreSQL database
     2. If no relevant results found, falls back to mock data for testing
     """
-    print(f"Searching for '{request}'")
-    
-    if request.fdc_id:
-        postgres_result = await search_products_by(f'fdc_id = {request.fdc_id}')
-    elif request.gtin_upc:
-        print(request.gtin_upc)
-        postgres_result = await search_products_by(f'gtin_upc = \'{request.gtin_upc}\'')
-    elif request.query:
-        postgres_result = await search_products_by(f'autocomplete @@ plainto_tsquery(\'{request.query.lower().replace(" ", "+")}\')')
+    log.debug("Searching for '%s'", request)
+
+    for field in _SEARCH_CONDITIONS:
+        value = getattr(request, field)
+        if value:
+            if field == 'query':
+                value = value.lower().replace(' ', '+')
+            postgres_result = await _search_cached(field, value)
+            break
+    else:
+        postgres_result = None
 
     if postgres_result:
-        print(f"PostgreSQL found result: '{postgres_result.name}'")
+        log.debug("PostgreSQL found result: '%s'", postgres_result.name)
         return postgres_result
     
     return None
 
-async def calculate_processed_score(ingredients: str) -> Tuple[int, str]:
-    """
-    Calculate food processing score based on ingredients list
-    
-    Returns:
-        Tuple of (score, explanation) where score is 1-5 and explanation describes the score
+@async_lru(maxsize=4096)
+async def calculate_full_analysis(ingredients: str, nutrients: str) -> CombinedDieticianResponse:
     """
-    result: RunResponse = await agent.get_processed_score.arun(f"Ingredients: {ingredients}")
-    result: DieticanAgentResponse = result.content
-    return (result.score, result.score_explanation.strip())
+    Calculate processing score, nutrition score, and potential health issues
+    in a single Gemini call
 
-async def get_health_issues(ingredients: str) -> PotentialHealthIssues:
-    """
-    Get potential health issues based on ingredients list
-    
     Returns:
-        List of health issues
-    """
-    issues: RunResponse = await agent.get_health_issues.arun(f"Ingredients: {ingredients}")
-    issues: PotentialHealthIssues = issues.content
-    return issues
-    
-async def calculate_nutrition_score(nutrients: str) -> Tuple[int, str]:
+        CombinedDieticianResponse with both scores, their explanations, and health issues
     """
-    Calculate nutrients score based on FDC ID
-    
-    Returns:
-        Tuple of (score, explanation) where score is 1-5 and explanation describes the score
-    """
-    result: RunResponse = await agent.get_nutrition_score.arun(f"Nutritional Information: {nutrients}")
-    result: DieticanAgentResponse = result.content
-    return (result.score, result.score_explanation.strip())
+    result: RunResponse = await agent.get_full_analysis.arun(
+        f"Ingredients: {ingredients}\nNutritional Information: {nutrients}"
+    )
+    return result.content
 
+@async_lru(maxsize=4096)
 async def get_product_url(name: str, brand: Optional[str]) -> Optional[str]:
     """
     Get product URL from PostgreSQL database by FDC ID
     """
     try:
         result: RunResponse = await agent.get_product_url.arun(f"{name} {f'by {brand}' if brand else ''}")
-        result: HttpUrl = result.content.strip()
-        return str(result)
+        url = (result.content or '').strip()
+        if not url.startswith('http'):
+            # Covers "No URL found" and other non-URL replies
+            return None
+        return url
     except ValidationError as e:
-        print(f"Validation error getting product URL: {e}")
+        log.warning("Validation error getting product URL: %s", e)
         return None
@@ -1,84 +1,196 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from .schemas import ProductSearchRequest, ProductSearchResponse, ErrorResponse, AutocompleteSuggestion, ServiceHealthCheckResponse
-from .crud import search_products, get_autocomplete_suggestions
+from .crud import search_products, get_autocomplete_suggestions, get_prebaked_suggestions, start_prefix_index_refresh, get_index_generation, ProductSearchError
 
-from typing import List
+import asyncio
+import hashlib
+import logging
+import orjson
+import logging.handlers
+import queue
+from typing import List, Optional
 from datetime import datetime
 
 
+def _configure_logging() -> None:
+    """
+    Route all records through a queue so formatting and the blocking stdio
+    write happen on a background thread instead of the event loop
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+_configure_logging()
+log = logging.getLogger(__name__)
+
 app = FastAPI(
     title="InformedChoice API",
     description="API for fetching Walmart product information and its processing level.",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse  # orjson serializes responses several times faster than stdlib json
 )
 
-# CORS Middleware Configuration
-origins = [
-    "http://localhost:8081",  # Expo Web/Development server
-    "exp://*", # For Expo Go app on physical devices (adjust if needed)
-    # Add other origins if necessary, e.g., your deployed frontend URL
-    "https://informedchoice--latest.expo.app"
-]
+# CORS configuration: one compiled regex instead of an origin list — the old
+# "exp://*" entry was matched literally by Starlette and never actually
+# allowed Expo Go devices. Covers the Expo dev server, Expo Go on device,
+# and the deployed frontend.
+origin_regex = r"^(http://localhost:8081|exp://.*|https://informedchoice--latest\.expo\.app)$"
+
+# Product responses are multi-KB of JSON text (ingredients, explanations,
+# health issues) that compresses ~5-10x; level 4 keeps the CPU cost small.
+# Tiny payloads like autocomplete stay below minimum_size and are untouched.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=4)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origin_regex=origin_regex,
     allow_credentials=True,
-    allow_methods=["*"], # Allows all methods (GET, POST, etc.)
-    allow_headers=["*"], # Allows all headers
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["content-type", "authorization"],
+    max_age=86400,  # cache preflight responses for a day — one fewer round-trip per session
 )
 
+@app.on_event("startup")
+async def startup() -> None:
+    # Build the in-memory autocomplete index (and keep it fresh) without
+    # blocking the server from accepting traffic
+    start_prefix_index_refresh()
+
+
+# response_model=None on these endpoints: the handlers already hold validated
+# model instances, so FastAPI re-validating them on the way out is pure
+# overhead; the 200 entry in responses keeps the OpenAPI schema accurate
 @app.get("/v1/autocomplete",
-         response_model=List[AutocompleteSuggestion],
+         response_model=None,
          responses={
+             200: {"model": List[AutocompleteSuggestion], "description": "Matching products"},
              400: {"model": ErrorResponse, "description": "Invalid query"},
              500: {"model": ErrorResponse, "description": "Internal server error"}
          })
-async def autocomplete_endpoint(q: str):
+async def autocomplete_endpoint(request: Request, q: str = Query(..., min_length=2, max_length=64)):
     """
     Get autocomplete suggestions for product search.
     Returns top 5 matching product names.
     """
     query = q.strip()
-    
-    if not query or len(query) < 2:
-        return []
+
+    # Weak ETag over the index generation plus the normalized query:
+    # suggestions for a prefix only drift when the index refreshes, so
+    # browsers repeating the same keystrokes can revalidate instead of
+    # re-downloading the body — and the generation counter rolls the ETag
+    # over whenever a rebuild may have changed it
+    etag = f'W/"{hashlib.md5(f"{get_index_generation()}:{query.lower()}".encode()).hexdigest()}"'
+    headers = {
+        "Cache-Control": "public, max-age=60, stale-while-revalidate=300",
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Short prefixes dominate traffic and are pre-serialized at index build
+    if (baked := get_prebaked_suggestions(query)) is not None:
+        return Response(content=baked, media_type="application/json", headers=headers)
 
     try:
         suggestions = await get_autocomplete_suggestions(query)
-        return suggestions
+        return ORJSONResponse([s.model_dump(mode="json") for s in suggestions], headers=headers)
     except Exception as e:
-        print(f"Autocomplete error: {e}")
+        log.error("Autocomplete error: %s", e)
         return []
 
 
+# Coalesce concurrent identical searches: when a trending product is queried
+# by many clients at once, only the first request runs the pipeline and the
+# duplicates await the same in-flight future
+_inflight = {}
+_inflight_lock = asyncio.Lock()
+
+
+async def _coalesced_search(request_body: ProductSearchRequest) -> Optional[ProductSearchResponse]:
+    key = (request_body.fdc_id, request_body.gtin_upc, (request_body.query or '').lower().strip())
+
+    async with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            leader = False
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _inflight[key] = future
+            leader = True
+
+    if not leader:
+        return await future
+
+    try:
+        result = await search_products(request_body)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved so the loop doesn't warn when there are no waiters
+        raise
+    finally:
+        # If the leader was cancelled (client disconnect), neither branch
+        # above resolved the future — cancel it so waiters get CancelledError
+        # instead of awaiting forever
+        if not future.done():
+            future.cancel()
+        async with _inflight_lock:
+            _inflight.pop(key, None)
+
+
 @app.post("/v1/search-products",
-            response_model=ProductSearchResponse,
+            response_model=None,
             responses={
+                200: {"model": ProductSearchResponse, "description": "Product found"},
                 400: {"model": ErrorResponse, "description": "Invalid search query"},
                 404: {"model": ErrorResponse, "description": "No products found"},
                 500: {"model": ErrorResponse, "description": "Internal server error"}
             })
-async def search_products_endpoint(request_body: ProductSearchRequest):
+async def search_products_endpoint(request_body: ProductSearchRequest, request: Request):
     """
     Search for products using natural language query.
     Returns product information including ingredients and processing score.
     """
-    print(request_body)
+    # An all-empty body is rejected by ProductSearchRequest's model validator
+    # (422 from pydantic-core) before this function runs
+    log.debug("Search request: %s", request_body)
     try:
-        if request_body.fdc_id is None and request_body.gtin_upc is None and request_body.query is None:
-            raise HTTPException(status_code=400, detail="Search query cannot be empty.")
-        product_data = await search_products(request_body)
+        product_data = await _coalesced_search(request_body)
         if product_data is None:
             raise HTTPException(status_code=404, detail="No products found.")
-        return product_data
+
+        # Strong ETag over the serialized body: the response for a product is
+        # deterministic for a given DB snapshot, so refreshes can skip the
+        # payload entirely
+        body = orjson.dumps(product_data.model_dump(mode="json"))
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except HTTPException:
+        # Let the 400/404 raised above pass through instead of being
+        # swallowed and reissued as a 500
+        raise
+    except ProductSearchError as e:
+        log.error("Product search failed: %s", e)
+        raise HTTPException(status_code=500, detail="Error during product search.")
     except Exception as e:
-        # Log the exception e here in a real application
-        print(f"An unexpected error occurred: {e}")  # For MVP, print to console
-        if "Simulated search error" in str(e):
-            raise HTTPException(status_code=500, detail="Error during product search.")
+        log.error("An unexpected error occurred: %s", e)
         raise HTTPException(status_code=500, detail="An internal server error occurred.")
 
 
@@ -101,4 +213,5 @@ async def health_check():
 
 # To run the backend (save this as a comment or in README):
 # cd backend
-# python -m uvicorn app.main:app --reload
+# python -m uvicorn app.main:app --reload          # development
+# gunicorn -c gunicorn_conf.py app.main:app        # production (uvloop workers)
@@ -0,0 +1,73 @@
+from bisect import bisect_left
+
+from typing import List
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over product name/brand tokens
+
+    Built from the products table at startup and rebuilt periodically, so an
+    autocomplete keystroke is a bisect over sorted keys instead of a database
+    round-trip. Product payloads live in parallel column lists (one list per
+    field) and the sorted token list points at row indices, which keeps the
+    index compact and cache-friendly.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._key_rows: List[int] = []
+        self.fdc_ids: List[int] = []
+        self.names: List[str] = []
+        self.brands: List[str] = []
+        self.categories: List[str] = []
+        self.ready = False
+
+    def build(self, rows) -> None:
+        """Rebuild the index from (fdc_id, description, brand_name, brand_owner, branded_food_category) rows"""
+        fdc_ids, names, brands, categories = [], [], [], []
+        entries = []
+        for i, row in enumerate(rows):
+            name = row['description'] or ''
+            brand = row['brand_name'] or row['brand_owner'] or ''
+            fdc_ids.append(row['fdc_id'])
+            names.append(name)
+            brands.append(brand)
+            categories.append(row['branded_food_category'] or '')
+            for token in set(f"{name} {brand}".lower().split()):
+                entries.append((token, i))
+        entries.sort()
+
+        # Swap everything in at once so concurrent lookups never see a
+        # half-built index
+        self._keys = [key for key, _ in entries]
+        self._key_rows = [row for _, row in entries]
+        self.fdc_ids = fdc_ids
+        self.names = names
+        self.brands = brands
+        self.categories = categories
+        self.ready = True
+
+    def token_prefixes(self, lengths=(2, 3)) -> set:
+        """Distinct token prefixes of the given lengths present in the index"""
+        return {key[:n] for key in self._keys for n in lengths if len(key) >= n}
+
+    def lookup(self, prefix: str, limit: int = 5) -> List[int]:
+        """
+        Row indices for products with a token starting with prefix
+
+        O(len(prefix) * log n) for the bisect plus O(limit) for the walk.
+        """
+        prefix = prefix.lower()
+        pos = bisect_left(self._keys, prefix)
+        hits = []
+        seen = set()
+        while pos < len(self._keys) and self._keys[pos].startswith(prefix):
+            row = self._key_rows[pos]
+            if row not in seen:
+                seen.add(row)
+                hits.append(row)
+                if len(hits) >= limit:
+                    break
+            pos += 1
+        return hits
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from typing import List, Optional
 
 
@@ -7,6 +7,14 @@ class ProductSearchRequest(BaseModel):
     gtin_upc: Optional[str] = Field(None, description="GTIN/UPC of the product")
     query: Optional[str] = Field(None, description="Natural language search query")
 
+    @model_validator(mode="after")
+    def _require_one_field(self):
+        # Rejected by pydantic-core during body parsing, so empty requests
+        # never reach the endpoint
+        if self.fdc_id is None and self.gtin_upc is None and not self.query:
+            raise ValueError("one of fdc_id, gtin_upc, or query must be provided")
+        return self
+
 class HealthIssueDetail(BaseModel):
     issue: str
     evidence: str
@@ -16,13 +24,20 @@ class IngredientHealthIssue(BaseModel):
     issues: List[HealthIssueDetail]
 
 class PotentialHealthIssues(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", str_strip_whitespace=True)
+
     potential_health_issues: List[IngredientHealthIssue]
 
-class DieticanAgentResponse(BaseModel):
-    score: int = Field(..., ge=1, le=5)
-    score_explanation: str
+class CombinedDieticianResponse(BaseModel):
+    processed_score: int = Field(..., ge=1, le=5)
+    processed_score_explanation: str
+    nutrition_score: int = Field(..., ge=1, le=5)
+    nutrition_score_explanation: str
+    health_issues: PotentialHealthIssues
 
 class ProductSearchResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", str_strip_whitespace=True)
+
     name: str
     brand: Optional[str] = None
     ingredients: List[str]
@@ -33,9 +48,11 @@ class ProductSearchResponse(BaseModel):
     nutrition_score_explanation: str
     health_issues: PotentialHealthIssues
     retailer: Optional[str] = None
-    url: Optional[HttpUrl] = None
+    url: Optional[str] = None
 
 class AutocompleteSuggestion(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore", str_strip_whitespace=True)
+
     fdc_id: int
     name: str
     brand: Optional[str] = None
@@ -0,0 +1,94 @@
+import re
+
+from typing import List, Tuple
+
+
+# Additives and industrial ingredients that mark a product as ultra-processed
+ULTRA_PROCESSED_INDICATORS = (
+    "HIGH FRUCTOSE CORN SYRUP",
+    "CORN SYRUP",
+    "HYDROGENATED",
+    "MALTODEXTRIN",
+    "MONO AND DIGLYCERIDES",
+    "ARTIFICIAL FLAVOR",
+    "NATURAL FLAVOR",
+    "MODIFIED CORN STARCH",
+    "SOY LECITHIN",
+    "SOY PROTEIN ISOLATE",
+    "CARRAGEENAN",
+    "POLYSORBATE",
+    "ASPARTAME",
+    "SUCRALOSE",
+    "ACESULFAME",
+    "MONOSODIUM GLUTAMATE",
+    "SODIUM BENZOATE",
+    "POTASSIUM SORBATE",
+    "XANTHAN GUM",
+    "GUAR GUM",
+    "CELLULOSE GUM",
+    "CELLULOSE GEL",
+    "RED 40",
+    "YELLOW 5",
+    "BLUE 1",
+)
+
+# One compiled alternation gives a single C-level scan per ingredient string
+# instead of a Python loop over every indicator. Patterns are upper-cased at
+# build time so only the input needs normalizing at match time.
+_INDICATOR_RE = re.compile("|".join(re.escape(ind) for ind in ULTRA_PROCESSED_INDICATORS))
+
+
+def _score_from_counts(ingredient_count: int, indicator_count: int) -> int:
+    """Pure integer scoring kernel shared by the single and batch paths"""
+    if indicator_count == 0 and ingredient_count <= 1:
+        return 1
+    elif indicator_count == 0 and ingredient_count <= 5:
+        return 2
+    elif indicator_count <= 1:
+        return 3
+    elif indicator_count <= 3:
+        return 4
+    return 5
+
+
+def _explain(score: int, hits: set) -> str:
+    if score == 1:
+        return "Single-ingredient or whole food with no ultra-processed indicators."
+    elif score == 2:
+        return "Few recognizable ingredients with no ultra-processed indicators."
+    elif score == 3:
+        return "Moderate ingredient list with at most one ultra-processed indicator."
+    elif score == 4:
+        return f"Contains {len(hits)} ultra-processed indicators: {', '.join(sorted(hits))}."
+    return f"Dominated by industrial additives ({len(hits)} indicators): {', '.join(sorted(hits))}."
+
+
+def calculate_processing_score(ingredients: List[str]) -> Tuple[int, str]:
+    """
+    Heuristic NOVA-style processing score based on the ingredients list
+
+    Used on the bulk ingestion path where a Gemini call per product is
+    infeasible; the dietician agent remains the source of truth for the API.
+
+    Returns:
+        Tuple of (score, explanation) where score is 1-5 and explanation describes the score
+    """
+    ingredient_count = len(ingredients)
+    # One join + one upper-case + one scan, instead of allocating an
+    # upper-cased copy of every ingredient and scanning each separately
+    joined = ";".join(ingredients).upper()
+    hits = {match.group(0) for match in _INDICATOR_RE.finditer(joined)}
+
+    score = _score_from_counts(ingredient_count, len(hits))
+    return (score, _explain(score, hits))
+
+
+def calculate_processing_scores(ingredient_lists: List[List[str]]) -> List[Tuple[int, str]]:
+    """
+    Batch variant for dataset ingestion — scores every product with the
+    one module-level compiled matcher
+
+    Returns:
+        List of (score, explanation) tuples, one per product
+    """
+    return [calculate_processing_score(ingredients) for ingredients in ingredient_lists]
@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+from uvicorn.workers import UvicornWorker
+
+# Production entrypoint:
+#   gunicorn -c gunicorn_conf.py app.main:app
+#
+# The endpoints are I/O-bound (DB + Gemini), so worker processes scale the
+# app across cores while uvloop/httptools keep each event loop fast.
+
+
+class InformedChoiceWorker(UvicornWorker):
+    """UvicornWorker pinned to uvloop + httptools
+
+    gunicorn ignores unknown names in config files, and UvicornWorker reads
+    its loop/http choice from CONFIG_KWARGS — plain `loop = "uvloop"` lines
+    here would be inert.
+    """
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2 * multiprocessing.cpu_count() + 1))
+worker_class = "gunicorn_conf.InformedChoiceWorker"
+
+keepalive = 30
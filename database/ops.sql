@@ -58,3 +58,11 @@ FROM (
     GROUP BY fdc_id
 ) n
 WHERE products.fdc_id = n.fdc_id;
+
+-- Indexes for the search hot paths: without the GIN index the
+-- autocomplete @@ plainto_tsquery(...) match is a sequential scan, and
+-- barcode lookups by gtin_upc have no index at all (fdc_id is already
+-- covered by the primary key). CONCURRENTLY avoids locking the table
+-- while the index builds.
+CREATE INDEX CONCURRENTLY products_autocomplete_gin ON products USING GIN (autocomplete);
+CREATE INDEX CONCURRENTLY products_gtin_upc_idx ON products (gtin_upc);